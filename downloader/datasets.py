@@ -19,7 +19,6 @@
 #
 
 import os
-from pydoc import locate
 import tarfile
 import zipfile
 import inspect
@@ -90,11 +89,12 @@ class DataDownloader():
                              **self._args)
 
         elif self._type == DatasetType.TORCHVISION:
-            from torchvision.datasets import __all__ as torchvision_datasets
-            dataset_class = locate('torchvision.datasets.{}'.format(self._dataset_name))
-            if dataset_class:
+            import torchvision.datasets
+            torchvision_datasets = torchvision.datasets.__all__
+            if self._dataset_name in torchvision_datasets:
+                dataset_class = getattr(torchvision.datasets, self._dataset_name)
                 params = inspect.signature(dataset_class).parameters
-                kwargs = dict(download=True, split=split, train=split == 'train')
+                kwargs = dict(download=self._args.get('download', True), split=split, train=split == 'train')
                 kwargs = dict([(k, v) for k, v in kwargs.items() if k in params])
                 return dataset_class(self._dataset_dir, **kwargs)
             else:
@@ -19,15 +19,19 @@
 #
 
 import os
+import itertools
 import math
+import pickle
 import pytest
 import shutil
 import tempfile
 import pandas as pd
 from numpy.testing import assert_array_equal
 from PIL import Image
+from unittest.mock import patch
 import random
 import string
+from types import SimpleNamespace
 
 from tlt.datasets.dataset_factory import get_dataset, load_dataset
 
@@ -37,6 +41,17 @@ try:
 except ModuleNotFoundError:
     print("Unable to import TorchvisionImageClassificationDataset. Torch may not be installed")
 
+try:
+    # Do torch specific imports in a try/except to prevent pytest test loading from failing when running in a TF env
+    import torch
+    import torchvision.transforms as T
+    from torchvision.transforms.functional import pil_to_tensor
+    from tlt.datasets.image_classification.torchvision_image_classification_dataset import _PersistentDataset, \
+        _BiasedConcatDataset, _already_present, _concat_datasets, _jpeg_samples, _collate_encoded, \
+        _EncodedJPEGDataset, _DeviceDecodeLoader
+except ModuleNotFoundError:
+    print("Unable to import torch. Torch may not be installed")
+
 try:
     # Do torch specific imports in a try/except to prevent pytest test loading from failing when running in a TF env
     from tlt.datasets.image_classification.pytorch_custom_image_classification_dataset import PyTorchCustomImageClassificationDataset  # noqa: E501
@@ -71,6 +86,275 @@ def test_torchvision_subset():
     assert len(data.dataset) > 0
 
 
+@pytest.mark.pytorch
+def test_torchvision_in_memory():
+    """
+    Checks that a torchvision subset loaded into memory has the same samples and can be preprocessed
+    """
+    data = get_dataset('/tmp/data', 'image_classification', 'pytorch', 'CIFAR10', 'torchvision', split=["test"])
+    in_memory_data = get_dataset('/tmp/data', 'image_classification', 'pytorch', 'CIFAR10', 'torchvision',
+                                 split=["test"], in_memory=True)
+    assert len(in_memory_data.dataset) == len(data.dataset)
+    assert in_memory_data.class_names == data.class_names
+    assert in_memory_data.dataset[0][1] == data.dataset[0][1]
+
+    in_memory_data.preprocess(32, batch_size=8)
+    images, labels = in_memory_data.get_batch()
+    assert images.shape == (8, 3, 32, 32)
+
+
+class SplitDatasetForTest(list):
+    """
+    A list of samples with class names, which stands in for a split of a torchvision dataset
+    """
+    classes = ['foo', 'bar']
+
+
+def make_download_for_test(missing_split=None, error=TypeError):
+    """
+    Returns a function that stands in for DataDownloader.download with a torchvision dataset that has train, val, and
+    test splits, except for the missing split, which raises the error
+    """
+    samples = {'train': range(20), 'val': range(100, 105), 'test': range(200, 203)}
+
+    def download(downloader, split='train'):
+        if split == missing_split:
+            raise error("The {} split is not available".format(split))
+        return SplitDatasetForTest(samples[split])
+
+    return download
+
+
+@pytest.mark.pytorch
+@pytest.mark.parametrize('split',
+                         [list(s) for s in itertools.permutations(['train', 'validation', 'test'])])
+def test_torchvision_split_order(tmp_path, split):
+    """
+    Checks that the splits of a torchvision dataset are concatenated in train, validation, test order, no matter
+    which order they are given in
+    """
+    with patch('downloader.datasets.DataDownloader.download', autospec=True, side_effect=make_download_for_test()):
+        data = TorchvisionImageClassificationDataset(str(tmp_path), 'CIFAR10', split=split, num_workers=0)
+
+    assert len(data.dataset) == 28
+    assert_array_equal(data._train_indices, range(20))
+    assert_array_equal(data._validation_indices, range(20, 25))
+    assert_array_equal(data._test_indices, range(25, 28))
+    assert [data.dataset[i] for i in range(28)] == list(range(20)) + list(range(100, 105)) + list(range(200, 203))
+    assert [data.train_subset[i] for i in range(20)] == list(range(20))
+    assert [data.validation_subset[i] for i in range(5)] == list(range(100, 105))
+    assert [data.test_subset[i] for i in range(3)] == list(range(200, 203))
+    assert data._validation_type == 'defined_split'
+
+
+@pytest.mark.pytorch
+@pytest.mark.parametrize('split,missing_split,error',
+                         [[['validation'], 'val', TypeError],
+                          [['train', 'validation'], 'val', ValueError],
+                          [['validation', 'train', 'test'], 'val', TypeError],
+                          [['test'], 'test', TypeError],
+                          [['test', 'train'], 'test', ValueError]])
+def test_torchvision_missing_split(tmp_path, split, missing_split, error):
+    """
+    Checks that loading a split that the torchvision dataset does not have raises a ValueError
+    """
+    split_name = 'validation' if missing_split == 'val' else missing_split
+    with patch('downloader.datasets.DataDownloader.download', autospec=True,
+               side_effect=make_download_for_test(missing_split, error)):
+        with pytest.raises(ValueError, match='No {} split was found for this dataset: CIFAR10'.format(split_name)):
+            TorchvisionImageClassificationDataset(str(tmp_path), 'CIFAR10', split=split, num_workers=0)
+
+
+@pytest.mark.pytorch
+def test_jpeg_samples():
+    """
+    Checks that the samples of a torchvision dataset are only returned when all of the images are JPEG files
+    """
+    jpeg_samples = [('a.jpg', 0), ('b.JPEG', 1)]
+    assert _jpeg_samples(SimpleNamespace(samples=jpeg_samples)) == jpeg_samples
+    assert _jpeg_samples(SimpleNamespace(samples=jpeg_samples + [('c.png', 1)])) is None
+    image_files_data = SimpleNamespace(_image_files=['a.jpg', 'b.jpg'], _labels=[0, 1])
+    assert _jpeg_samples(image_files_data) == [('a.jpg', 0), ('b.jpg', 1)]
+    assert _jpeg_samples(SimpleNamespace(data=[], targets=[])) is None
+
+
+@pytest.mark.pytorch
+def test_collate_encoded():
+    """
+    Checks that encoded images of different lengths are collated into a list of images and a tensor of labels
+    """
+    batch = [(torch.tensor([1, 2, 3], dtype=torch.uint8), 0), (torch.tensor([4], dtype=torch.uint8), 1)]
+    images, labels = _collate_encoded(batch)
+    assert len(images) == 2
+    assert torch.equal(images[0], batch[0][0])
+    assert torch.equal(images[1], batch[1][0])
+    assert torch.equal(labels, torch.tensor([0, 1]))
+
+
+@pytest.mark.pytorch
+def test_device_transform():
+    """
+    Checks that the transform for decoded image tensors converts them to float instead of converting PIL images, and
+    gives the same result as the dataset's transform
+    """
+    transform = T.Compose([T.Resize(8), T.ToTensor(), T.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])])
+    data = SimpleNamespace(_dataset=SimpleNamespace(transform=transform))
+    device_transform = TorchvisionImageClassificationDataset._device_transform(data)
+    assert [type(t) for t in device_transform.transforms] == [T.Resize, T.ConvertImageDtype, T.Normalize]
+
+    image = Image.new(mode='RGB', size=(16, 16), color=(255, 128, 0))
+    assert torch.allclose(device_transform(pil_to_tensor(image)), transform(image), atol=1e-2)
+
+    assert TorchvisionImageClassificationDataset._device_transform(
+        SimpleNamespace(_dataset=SimpleNamespace(transform=None))) is None
+
+
+@pytest.mark.pytorch
+@pytest.mark.parametrize('cuda_available,file_format,gpu_decode',
+                         [[False, 'jpg', False],
+                          [True, 'png', False],
+                          [True, 'jpg', True]])
+def test_torchvision_gpu_decode(tmp_path, cuda_available, file_format, gpu_decode):
+    """
+    Checks that gpu_decode only reads the encoded images when CUDA is available and the images are JPEG files, and
+    otherwise falls back to decoding on the CPU
+    """
+    samples = []
+    for i in range(2):
+        path = str(tmp_path / 'img_{}.{}'.format(i, file_format))
+        Image.new(mode='RGB', size=(24, 24)).save(path)
+        samples.append((path, i))
+    split_data = SplitDatasetForTest(samples)
+    split_data.samples = samples
+
+    with patch('downloader.datasets.DataDownloader.download', return_value=split_data), \
+            patch('torch.cuda.is_available', return_value=cuda_available):
+        data = TorchvisionImageClassificationDataset(str(tmp_path), 'CIFAR10', num_workers=0, gpu_decode=True)
+
+    assert data._gpu_decode == gpu_decode
+    if gpu_decode:
+        assert isinstance(data.dataset, _EncodedJPEGDataset)
+        assert isinstance(data._data_loader, _DeviceDecodeLoader)
+        encoded, label = data.dataset[1]
+        with open(samples[1][0], 'rb') as f:
+            assert encoded.numpy().tobytes() == f.read()
+        assert label == 1
+    else:
+        assert data.dataset is split_data
+        assert not isinstance(data._data_loader, _DeviceDecodeLoader)
+
+
+@pytest.mark.pytorch
+def test_torchvision_gpu_decode_distributed(tmp_path):
+    """
+    Checks that gpu_decode cannot be used with distributed training
+    """
+    with pytest.raises(ValueError, match='gpu_decode cannot be used with distributed training'):
+        TorchvisionImageClassificationDataset(str(tmp_path), 'CIFAR10', gpu_decode=True, distributed=True)
+
+
+@pytest.mark.pytorch
+def test_already_present(tmp_path):
+    """
+    Checks that a torchvision dataset is only found to be present when all of its extracted files exist
+    """
+    dataset_dir = str(tmp_path)
+    assert not _already_present(dataset_dir, 'CIFAR10')
+    os.makedirs(os.path.join(dataset_dir, 'cifar-10-batches-py'))
+    open(os.path.join(dataset_dir, 'cifar-10-batches-py', 'batches.meta'), 'w').close()
+    assert _already_present(dataset_dir, 'CIFAR10')
+
+    # The DTD archive extracts to dtd/dtd, which has the images and labels folders
+    os.makedirs(os.path.join(dataset_dir, 'dtd', 'dtd', 'images'))
+    assert not _already_present(dataset_dir, 'DTD')
+    os.makedirs(os.path.join(dataset_dir, 'dtd', 'dtd', 'labels'))
+    assert _already_present(dataset_dir, 'DTD')
+
+
+@pytest.mark.pytorch
+@pytest.mark.parametrize('large_position', [0, 1, 2])
+def test_biased_concat_dataset(large_position):
+    """
+    Checks that concatenating datasets where one has most of the samples uses a _BiasedConcatDataset, which returns
+    the same samples as a ConcatDataset for every index
+    """
+    datasets = [list(range(1000, 1010)), list(range(2000, 2005))]
+    datasets.insert(large_position, list(range(1000)))
+    concat_data = _concat_datasets(datasets)
+    expected_data = torch.utils.data.ConcatDataset(datasets)
+
+    assert isinstance(concat_data, _BiasedConcatDataset)
+    assert len(concat_data) == len(expected_data)
+    for i in range(-len(expected_data), len(expected_data)):
+        assert concat_data[i] == expected_data[i]
+
+
+@pytest.mark.pytorch
+def test_concat_dataset_balanced():
+    """
+    Checks that concatenating datasets where no dataset has more than 95% of the samples uses a ConcatDataset
+    """
+    concat_data = _concat_datasets([list(range(950)), list(range(1000, 1050))])
+    assert not isinstance(concat_data, _BiasedConcatDataset)
+    assert isinstance(concat_data, torch.utils.data.ConcatDataset)
+
+    concat_data = _concat_datasets([list(range(951)), list(range(1000, 1049))])
+    assert isinstance(concat_data, _BiasedConcatDataset)
+
+
+class TransformedTensorDataset:
+    """
+    A small dataset of random image tensors, which returns the images with a transform applied
+    """
+    def __init__(self, length):
+        self.images = torch.rand(length, 3, 8, 8)
+        self.targets = list(range(length))
+        self.transform = torch.neg
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        return self.transform(self.images[idx]), self.targets[idx]
+
+
+@pytest.mark.pytorch
+def test_persistent_dataset(tmp_path):
+    """
+    Checks that the persistent dataset has the transformed samples of the source dataset, that the cache is not
+    written again by a second persistent dataset, and that pickling does not include the memory mapped images
+    """
+    source = TransformedTensorDataset(10)
+    cache_path = str(tmp_path / 'cache')
+    data = _PersistentDataset(source, cache_path)
+
+    assert len(data) == len(source)
+    for i in range(len(source)):
+        image, label = data[i]
+        expected_image, expected_label = source[i]
+        assert torch.equal(image, expected_image)
+        assert label == expected_label
+
+    with patch.object(_PersistentDataset, '_write_cache') as mock_write_cache:
+        cached_data = _PersistentDataset(source, cache_path)
+        mock_write_cache.assert_not_called()
+    assert len(cached_data) == len(source)
+
+    assert data._images is not None
+    unpickled_data = pickle.loads(pickle.dumps(data))
+    assert unpickled_data._images is None
+    assert torch.equal(unpickled_data[0][0], source[0][0])
+
+
+@pytest.mark.pytorch
+def test_persistent_dataset_empty(tmp_path):
+    """
+    Checks that an empty dataset can be cached
+    """
+    data = _PersistentDataset(TransformedTensorDataset(0), str(tmp_path / 'cache'))
+    assert len(data) == 0
+
+
 @pytest.mark.pytorch
 def test_defined_split():
     """
@@ -166,54 +166,79 @@ def test_get_supported_models_bad_use_case(bad_use_case):
         assert "Unsupported use case: {}".format(bad_use_case) in str(e)
 
 
+@pytest.fixture
+def mock_torchvision_training():
+    """
+    Patches the torchvision dataset and the model's _get_hub_model function, and yields both mocks
+    """
+    dataset_patch = patch('tlt.datasets.image_classification.torchvision_image_classification_dataset.'
+                          'TorchvisionImageClassificationDataset')
+    get_hub_model_patch = patch('tlt.models.image_classification.torchvision_image_classification_model.'
+                                'TorchvisionImageClassificationModel._get_hub_model')
+    with dataset_patch as mock_dataset, get_hub_model_patch as mock_get_hub_model:
+        yield mock_dataset, mock_get_hub_model
+
+
 @pytest.mark.pytorch
-def test_torchvision_efficientnet_b0_train():
+def test_torchvision_efficientnet_b0_train(mock_torchvision_training):
     """
     Tests calling train on a torchvision efficientnet_b0 model with a mock dataset, model, and optimizer
     """
     model = model_factory.get_model('efficientnet_b0', 'pytorch')
     model._generate_checkpoints = False
+    mock_dataset, mock_get_hub_model = mock_torchvision_training
+
+    mock_dataset.train_subset = [1, 2, 3]
+    mock_dataset.validation_subset = [4, 5, 6]
+    mock_dataset.__class__ = TorchvisionImageClassificationDataset
+    mock_model = MagicMock()
+    mock_optimizer = MagicMock()
+    expected_return_value_model = mock_model
+    expected_return_value_history_val = {'Acc': [0.0], 'Loss': [0.0], 'Val Acc': [0.0], 'Val Loss': [0.0]}
+    expected_return_value_history_no_val = {'Acc': [0.0], 'Loss': [0.0]}
+
+    def mock_to(device):
+        assert device == torch.device("cpu")
+        return expected_return_value_model
+
+    def mock_train():
+        return None
+
+    mock_model.to = mock_to
+    mock_model.train = mock_train
+    mock_get_hub_model.return_value = (mock_model, mock_optimizer)
+
+    # Train and eval (eval should be called)
+    return_val = model.train(mock_dataset, output_dir="/tmp/output/pytorch", do_eval=True, lr_decay=False)
+    assert return_val == expected_return_value_history_val
+    mock_model.eval.assert_called_once()
+
+    # Train without eval (eval should not be called)
+    mock_model.eval.reset_mock()
+    return_val = model.train(mock_dataset, output_dir="/tmp/output/pytorch", do_eval=False, lr_decay=False)
+    assert return_val == expected_return_value_history_no_val
+    mock_model.eval.assert_not_called()
+
+    # Try to train with eval, but no validation subset (eval should not be called)
+    mock_dataset.validation_subset = None
+    mock_model.eval.reset_mock()
+    return_val = model.train(mock_dataset, output_dir="/tmp/output/pytorch", do_eval=True, lr_decay=False)
+    assert return_val == expected_return_value_history_no_val
+    mock_model.eval.assert_not_called()
+
+
+@pytest.mark.pytorch
+def test_torchvision_train_distributed_gpu_decode(mock_torchvision_training):
+    """
+    Checks that distributed training raises an error for a dataset that decodes images on the GPU
+    """
+    model = model_factory.get_model('efficientnet_b0', 'pytorch')
+    mock_dataset, _ = mock_torchvision_training
+    mock_dataset.__class__ = TorchvisionImageClassificationDataset
+    mock_dataset._gpu_decode = True
 
-    with patch('tlt.datasets.image_classification.torchvision_image_classification_dataset.TorchvisionImageClassificationDataset') as mock_dataset:  # noqa: E501
-        with patch('tlt.models.image_classification.torchvision_image_classification_model.'
-                   'TorchvisionImageClassificationModel._get_hub_model') as mock_get_hub_model:
-            mock_dataset.train_subset = [1, 2, 3]
-            mock_dataset.validation_subset = [4, 5, 6]
-            mock_dataset.__class__ = TorchvisionImageClassificationDataset
-            mock_model = MagicMock()
-            mock_optimizer = MagicMock()
-            expected_return_value_model = mock_model
-            expected_return_value_history_val = {'Acc': [0.0], 'Loss': [0.0], 'Val Acc': [0.0], 'Val Loss': [0.0]}
-            expected_return_value_history_no_val = {'Acc': [0.0], 'Loss': [0.0]}
-
-            def mock_to(device):
-                assert device == torch.device("cpu")
-                return expected_return_value_model
-
-            def mock_train():
-                return None
-
-            mock_model.to = mock_to
-            mock_model.train = mock_train
-            mock_get_hub_model.return_value = (mock_model, mock_optimizer)
-
-            # Train and eval (eval should be called)
-            return_val = model.train(mock_dataset, output_dir="/tmp/output/pytorch", do_eval=True, lr_decay=False)
-            assert return_val == expected_return_value_history_val
-            mock_model.eval.assert_called_once()
-
-            # Train without eval (eval should not be called)
-            mock_model.eval.reset_mock()
-            return_val = model.train(mock_dataset, output_dir="/tmp/output/pytorch", do_eval=False, lr_decay=False)
-            assert return_val == expected_return_value_history_no_val
-            mock_model.eval.assert_not_called()
-
-            # Try to train with eval, but no validation subset (eval should not be called)
-            mock_dataset.validation_subset = None
-            mock_model.eval.reset_mock()
-            return_val = model.train(mock_dataset, output_dir="/tmp/output/pytorch", do_eval=True, lr_decay=False)
-            assert return_val == expected_return_value_history_no_val
-            mock_model.eval.assert_not_called()
+    with pytest.raises(ValueError, match='gpu_decode'):
+        model.train(mock_dataset, output_dir="/tmp/output/pytorch", distributed=True)
 
 
 @pytest.mark.pytorch
@@ -25,6 +25,7 @@ import shutil
 import tempfile
 from numpy.testing import assert_array_equal
 from PIL import Image
+from unittest.mock import patch
 
 from tlt.datasets.dataset_factory import get_dataset, load_dataset
 
@@ -42,7 +43,9 @@ except ModuleNotFoundError:
 
 try:
     # Do TF specific imports in a try/except to prevent pytest test loading from failing when running in a PyTorch env
+    import tensorflow as tf
     from tlt.datasets.image_classification.tf_custom_image_classification_dataset import TFCustomImageClassificationDataset  # noqa: E501
+    from tlt.datasets.image_classification.tf_custom_image_classification_dataset import _walk_class_folder
 except ModuleNotFoundError:
     print("WARNING: Unable to import TFCustomImageClassificationDataset. TensorFlow may not be installed")
 
@@ -246,6 +249,213 @@ def test_batching_error(dataset_dir, use_case, dataset_name, dataset_catalog, cl
         ic_dataset.cleanup()
 
 
+@pytest.mark.tensorflow
+@pytest.mark.parametrize('resize_mode,jit_compile',
+                         [['pad', False],
+                          ['stretch', False],
+                          ['crop', False],
+                          ['pad', True],
+                          ['stretch', True],
+                          ['crop', True]])
+def test_custom_resize_mode(resize_mode, jit_compile):
+    """
+    Checks that a custom image dataset can be preprocessed with each of the resize modes, with and without XLA
+    compilation of the preprocessing functions
+    """
+    image_size = 32
+    batch_size = 4
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'])
+
+    try:
+        tlt_dataset = ic_dataset.tlt_dataset
+        tlt_dataset.preprocess(image_size, batch_size, jit_compile=jit_compile, resize_mode=resize_mode)
+        images, labels = tlt_dataset.get_batch()
+        assert images.shape == (batch_size, image_size, image_size, 3)
+        assert len(labels) == batch_size
+    finally:
+        ic_dataset.cleanup()
+
+
+@pytest.mark.tensorflow
+def test_custom_resize_mode_error():
+    """
+    Checks that an unsupported resize mode raises an error
+    """
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'])
+
+    try:
+        with pytest.raises(ValueError) as e:
+            ic_dataset.tlt_dataset.preprocess(32, 4, resize_mode='squash')
+        assert 'Unsupported resize_mode' in str(e)
+    finally:
+        ic_dataset.cleanup()
+
+
+@pytest.mark.tensorflow
+def test_custom_dataset_manifest():
+    """
+    Checks that loading a custom image dataset writes a manifest, and that loading the dataset again from the manifest
+    finds the same images and classes
+    """
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'])
+
+    try:
+        dataset_dir = ic_dataset.tlt_dataset.dataset_dir
+        # The manifest is written when the dataset is first loaded
+        assert len(ic_dataset.tlt_dataset.dataset) == 100
+        assert os.path.isfile(os.path.join(dataset_dir, '.tlt_manifest.tfrecord'))
+
+        # The reloaded dataset is listed from the manifest, without walking the class folders
+        with patch('tlt.datasets.image_classification.tf_custom_image_classification_dataset._walk_class_folder',
+                   wraps=_walk_class_folder) as mock_walk:
+            reloaded_dataset = load_dataset(dataset_dir, 'image_classification', 'tensorflow', seed=10)
+            assert reloaded_dataset.class_names == ic_dataset.tlt_dataset.class_names
+            assert len(reloaded_dataset.dataset) == len(ic_dataset.tlt_dataset.dataset)
+            mock_walk.assert_not_called()
+    finally:
+        ic_dataset.cleanup()
+
+
+@pytest.mark.tensorflow
+def test_custom_dataset_manifest_nested_folder():
+    """
+    Checks that the manifest of a custom image dataset is out of date after an image is added to a nested folder of
+    a class, so that the class folders are walked again and the new image is found
+    """
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'])
+
+    try:
+        dataset_dir = ic_dataset.tlt_dataset.dataset_dir
+        nested_dir = os.path.join(dataset_dir, 'foo', 'nested')
+        os.makedirs(nested_dir)
+        Image.new(mode='RGB', size=(24, 24)).save(os.path.join(nested_dir, 'img_0.jpg'))
+        # Make sure that adding an image changes the mtime of the nested folder, even with a coarse mtime resolution
+        os.utime(nested_dir, (0, 0))
+        assert len(load_dataset(dataset_dir, 'image_classification', 'tensorflow', seed=10).dataset) == 101
+
+        Image.new(mode='RGB', size=(24, 24)).save(os.path.join(nested_dir, 'img_1.jpg'))
+        with patch('tlt.datasets.image_classification.tf_custom_image_classification_dataset._walk_class_folder',
+                   wraps=_walk_class_folder) as mock_walk:
+            reloaded_dataset = load_dataset(dataset_dir, 'image_classification', 'tensorflow', seed=10)
+            assert len(reloaded_dataset.dataset) == 102
+            assert mock_walk.call_count == 2
+    finally:
+        ic_dataset.cleanup()
+
+
+@pytest.mark.tensorflow
+def test_custom_dataset_no_images():
+    """
+    Checks that an error is raised when the class folders of a custom image dataset do not have any images
+    """
+    dataset_dir = tempfile.mkdtemp(dir='/tmp/data')
+    try:
+        for class_name in ['foo', 'bar']:
+            os.makedirs(os.path.join(dataset_dir, class_name))
+            with open(os.path.join(dataset_dir, class_name, 'notes.txt'), 'w') as f:
+                f.write('not an image')
+
+        tlt_dataset = load_dataset(dataset_dir, 'image_classification', 'tensorflow')
+        with pytest.raises(ValueError, match='No images found in directory'):
+            tlt_dataset.dataset
+    finally:
+        shutil.rmtree(dataset_dir)
+
+
+@pytest.mark.tensorflow
+def test_custom_dataset_snapshot():
+    """
+    Checks that the preprocessed images of a custom image dataset are persisted to a snapshot, and that loading and
+    preprocessing the dataset again (with a different random shuffle) reuses the same snapshot
+    """
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'])
+
+    try:
+        dataset_dir = ic_dataset.tlt_dataset.dataset_dir
+        snapshot_dir = os.path.join(dataset_dir, '.tlt_snapshot', 'dataset')
+        for _ in range(2):
+            tlt_dataset = load_dataset(dataset_dir, 'image_classification', 'tensorflow')
+            tlt_dataset.preprocess(32, batch_size=10)
+            assert sum(len(labels) for _, labels in tlt_dataset.dataset) == 100
+            # The snapshot has a single fingerprint folder
+            assert len(os.listdir(snapshot_dir)) == 1
+    finally:
+        ic_dataset.cleanup()
+
+
+@pytest.mark.tensorflow
+def test_custom_dataset_cache_ram_budget():
+    """
+    Checks that the preprocessed images of a custom image dataset are cached in memory, instead of being persisted
+    to a snapshot, when they fit in the RAM budget
+    """
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'])
+
+    try:
+        dataset_dir = ic_dataset.tlt_dataset.dataset_dir
+        tlt_dataset = load_dataset(dataset_dir, 'image_classification', 'tensorflow', cache_ram_budget=10 ** 9)
+        tlt_dataset.preprocess(32, batch_size=10)
+        assert sum(len(labels) for _, labels in tlt_dataset.dataset) == 100
+        assert not os.path.exists(os.path.join(dataset_dir, '.tlt_snapshot'))
+    finally:
+        ic_dataset.cleanup()
+
+
+@pytest.mark.tensorflow
+def test_custom_dataset_preprocess_shuffle_split():
+    """
+    Checks that shuffle_split on a preprocessed custom image dataset splits the cached uint8 images, instead of
+    unbatching the float32 batches and caching them in memory
+    """
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'])
+
+    try:
+        tlt_dataset = ic_dataset.tlt_dataset
+        tlt_dataset.preprocess(32, batch_size=8)
+        tlt_dataset.shuffle_split(train_pct=.5, val_pct=.25, test_pct=.25, seed=10)
+
+        # The 100 images are 13 batches, which are split into 6 train, 3 validation, and 4 test batches
+        assert len(tlt_dataset.train_subset) == 6
+        assert len(tlt_dataset.validation_subset) == 3
+        assert len(tlt_dataset.test_subset) == 4
+        assert sum(len(labels) for _, labels in tlt_dataset.train_subset) == 48
+        assert sum(len(labels) for _, labels in tlt_dataset.validation_subset) == 24
+        assert sum(len(labels) for _, labels in tlt_dataset.test_subset) == 28
+
+        for subset in [tlt_dataset.train_subset, tlt_dataset.validation_subset, tlt_dataset.test_subset]:
+            graph_def = tf.compat.v1.GraphDef.FromString(subset._as_serialized_graph().numpy())
+            ops = [node.op for node in graph_def.node]
+            assert 'SnapshotDatasetV2' in ops
+            assert not any(op.startswith('CacheDataset') or op == 'UnbatchDataset' for op in ops)
+
+            images, labels = next(iter(subset))
+            assert images.dtype == tf.float32
+            assert images.shape == (8, 32, 32, 3)
+    finally:
+        ic_dataset.cleanup()
+
+
+@pytest.mark.tensorflow
+def test_custom_dataset_lazy_loading():
+    """
+    Checks that the class names of a custom image dataset are known before the image files are loaded, and that the
+    images are loaded when the dataset is first used
+    """
+    ic_dataset = DatasetForTest('/tmp/data', 'image_classification', None, None, ['foo', 'bar'], ['train', 'test'])
+
+    try:
+        tlt_dataset = ic_dataset.tlt_dataset
+        assert tlt_dataset.class_names == ['bar', 'foo']
+        assert tlt_dataset._dataset is None
+
+        assert len(tlt_dataset.dataset) == 200
+        assert len(tlt_dataset.train_subset) == 100
+        assert len(tlt_dataset.test_subset) == 100
+        assert tlt_dataset.class_names == ['bar', 'foo']
+    finally:
+        ic_dataset.cleanup()
+
+
 @pytest.mark.integration
 @pytest.mark.tensorflow
 @pytest.mark.parametrize('dataset_name,use_case,expected_class_names',
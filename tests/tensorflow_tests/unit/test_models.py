@@ -196,6 +196,18 @@ def test_get_supported_models_with_filter(framework, use_case):
                 assert framework in model_dict[use_case_key][model_name_key]
 
 
+@pytest.mark.tensorflow
+def test_get_supported_models_copy():
+    """
+    Ensure that modifying the returned dictionary of supported models does not change later results
+    """
+    model_dict = model_factory.get_supported_models('tensorflow', 'image_classification')
+    model_dict['image_classification'].clear()
+
+    model_dict = model_factory.get_supported_models('tensorflow', 'image_classification')
+    assert 'ResNet50' in model_dict['image_classification']
+
+
 @pytest.mark.tensorflow
 @pytest.mark.parametrize('bad_framework',
                          ['tensorflowers',
@@ -19,11 +19,217 @@
 #
 
 import os
+import math
+import numpy as np
 import tensorflow as tf
 
 from tlt.datasets.tf_dataset import TFDataset
 from tlt.datasets.image_classification.image_classification_dataset import ImageClassificationDataset
 
+ALLOWED_IMAGE_FORMATS = ('.bmp', '.gif', '.jpeg', '.jpg', '.png')
+COLOR_MODE_CHANNELS = {"grayscale": 1, "rgb": 3, "rgba": 4}
+
+# Size that the images are resized to when they are loaded (the same as the tf.keras.utils.image_dataset_from_directory
+# default), before preprocessing resizes them to the model's image size
+LOAD_IMAGE_SIZE = (256, 256)
+
+# Seed of the fixed permutation of the file list when shuffle_files is True. The order is the same in every process,
+# so that the snapshot of the preprocessed images has the same fingerprint and is reused across runs. The random,
+# per-run shuffle is done after the cache.
+FILE_ORDER_SEED = 0
+
+# Files written to the image directory to list its images, so that it does not need to be walked every time
+MANIFEST_FILE_NAME = ".tlt_manifest.tfrecord"
+
+
+def _read_manifest(directory, class_names):
+    """
+    Reads the file paths and labels from the manifest in the directory. Returns None if there is no manifest or if it
+    is out of date.
+    """
+    manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+    if not os.path.isfile(manifest_path):
+        return None
+
+    features = {'path': tf.io.FixedLenFeature([], tf.string), 'label': tf.io.FixedLenFeature([], tf.int64)}
+    file_paths = []
+    labels = []
+    try:
+        records = tf.data.TFRecordDataset(manifest_path)
+
+        # The first record has the class names that the labels refer to, and the mtimes of the folders that were
+        # listed. The manifest is out of date if the classes have changed, or if images were added to or removed
+        # from any of the folders (including nested folders) since they were listed.
+        header = tf.train.Example.FromString(next(iter(records.take(1))).numpy()).features.feature
+        if [c.decode() for c in header['classes'].bytes_list.value] != class_names:
+            return None
+        for folder, mtime in zip(header['folders'].bytes_list.value, header['mtimes'].int64_list.value):
+            if os.stat(os.path.join(directory, folder.decode())).st_mtime_ns != mtime:
+                return None
+
+        for batch in records.skip(1).batch(8192):
+            parsed = tf.io.parse_example(batch, features)
+            file_paths.extend([os.path.join(directory, p.decode()) for p in parsed['path'].numpy()])
+            labels.extend(parsed['label'].numpy().tolist())
+    except (StopIteration, OSError, tf.errors.OpError):
+        # The manifest is empty or can't be parsed, or a folder was removed, so the directory is walked again
+        return None
+
+    return file_paths, labels
+
+
+def _write_manifest(directory, file_paths, labels, class_names, folder_mtimes):
+    """
+    Writes the class names and folder mtimes, and the file paths (relative to the directory) and labels, to a
+    manifest in the directory. The class names and folder mtimes are the first record, so that the labels are never
+    read with a different list of classes or folders. The manifest is written to a temporary file first and then
+    renamed, so that a partially written manifest is never read.
+    """
+    manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+    folders = [os.path.relpath(f, directory).encode() for f in folder_mtimes.keys()]
+    try:
+        tmp_manifest_path = "{}.{}.tmp".format(manifest_path, os.getpid())
+        with tf.io.TFRecordWriter(tmp_manifest_path) as writer:
+            header = tf.train.Example(features=tf.train.Features(feature={
+                'classes': tf.train.Feature(bytes_list=tf.train.BytesList(value=[c.encode() for c in class_names])),
+                'folders': tf.train.Feature(bytes_list=tf.train.BytesList(value=folders)),
+                'mtimes': tf.train.Feature(int64_list=tf.train.Int64List(value=list(folder_mtimes.values())))}))
+            writer.write(header.SerializeToString())
+            for file_path, label in zip(file_paths, labels):
+                relative_path = os.path.relpath(file_path, directory).encode()
+                example = tf.train.Example(features=tf.train.Features(feature={
+                    'path': tf.train.Feature(bytes_list=tf.train.BytesList(value=[relative_path])),
+                    'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[label]))}))
+                writer.write(example.SerializeToString())
+        os.replace(tmp_manifest_path, manifest_path)
+    except (OSError, tf.errors.OpError):
+        # The directory may be read-only, in which case it will be walked every time that it is loaded
+        pass
+
+
+def _enumerate_classes(directory):
+    """
+    Returns the sorted list of class names, which are the names of the subfolders in the directory. Hidden folders
+    (like the .tlt_snapshot cache) are not image classes.
+    """
+    # The directory entries from scandir know their file type, so checking for folders does not need a stat call
+    with os.scandir(directory) as entries:
+        return sorted([e.name for e in entries if not e.name.startswith('.') and e.is_dir()])
+
+
+def _walk_class_folder(class_dir):
+    """
+    Lists the image files in a class folder and all of its subfolders, sorted by folder and then by file name.
+    Returns the list of file paths and a dictionary of the mtime of each folder. The mtime of a folder is read before
+    the folder is listed, so a file that is added or removed while the folder is being listed makes the manifest out
+    of date.
+    """
+    folder_mtimes = {}
+    folder_files = []
+    pending = [class_dir]
+    while pending:
+        folder = pending.pop()
+        folder_mtimes[folder] = os.stat(folder).st_mtime_ns
+        files = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Like os.walk, links to folders are not followed
+                    if not entry.is_symlink():
+                        pending.append(entry.path)
+                else:
+                    files.append(entry.name)
+        folder_files.append((folder, files))
+
+    file_paths = []
+    for folder, files in sorted(folder_files, key=lambda x: x[0]):
+        for file_name in sorted(files):
+            if file_name.lower().endswith(ALLOWED_IMAGE_FORMATS):
+                file_paths.append(os.path.join(folder, file_name))
+    return file_paths, folder_mtimes
+
+
+def _index_directory(directory, shuffle):
+    """
+    Lists the image files in a directory that has a subfolder of images for each class. Returns the list of file
+    paths, the list of their class indices, and the sorted list of class names. The listing is read from the
+    directory's manifest when it is up to date, otherwise the directory is walked and a new manifest is written.
+    If shuffle is True, the files are put in a fixed pseudo-random order (so that the classes are mixed), which is
+    the same every time that the directory is indexed. Raises a ValueError if there are no images.
+    """
+    class_names = _enumerate_classes(directory)
+    manifest = _read_manifest(directory, class_names)
+    if manifest is not None:
+        file_paths, labels = manifest
+    else:
+        file_paths = []
+        labels = []
+        folder_mtimes = {}
+        for class_index, class_name in enumerate(class_names):
+            class_file_paths, class_folder_mtimes = _walk_class_folder(os.path.join(directory, class_name))
+            file_paths.extend(class_file_paths)
+            labels.extend([class_index] * len(class_file_paths))
+            folder_mtimes.update(class_folder_mtimes)
+        if not file_paths:
+            raise ValueError("No images found in directory {}. Allowed formats: {}".format(
+                directory, ALLOWED_IMAGE_FORMATS))
+        _write_manifest(directory, file_paths, labels, class_names, folder_mtimes)
+
+    if shuffle:
+        # Shuffle the file paths and labels the same way
+        np.random.RandomState(FILE_ORDER_SEED).shuffle(file_paths)
+        np.random.RandomState(FILE_ORDER_SEED).shuffle(labels)
+
+    print("Found {} files belonging to {} classes.".format(len(file_paths), len(class_names)))
+    return file_paths, labels, class_names
+
+
+def _decode_image(contents, channels, image_size):
+    """
+    Decodes an image and resizes it to the image_size. JPEGs that are much larger than the image_size are downscaled
+    by libjpeg while decoding (using a ratio of 2, 4, or 8), which skips decoding pixels that would be thrown away.
+    """
+    def decode_jpeg():
+        shape = tf.io.extract_jpeg_shape(contents)
+        min_side = tf.reduce_min(shape[:2])
+        # Use the largest ratio that still keeps both sides of the decoded image at least as large as the image_size
+        min_target = min(image_size)
+        ratio_index = tf.reduce_sum(tf.cast(min_side >= [2 * min_target, 4 * min_target, 8 * min_target], tf.int32))
+        return tf.switch_case(ratio_index, [lambda r=r: tf.io.decode_jpeg(contents, channels=channels, ratio=r)
+                                            for r in [1, 2, 4, 8]])
+
+    def decode_other():
+        return tf.io.decode_image(contents, channels=channels, expand_animations=False)
+
+    if channels == 4:
+        # libjpeg does not decode JPEGs to RGBA
+        image = decode_other()
+    else:
+        image = tf.cond(tf.io.is_jpeg(contents), decode_jpeg, decode_other)
+
+    image.set_shape([None, None, channels])
+    return tf.image.resize(image, image_size)
+
+
+def _image_dataset_from_directory(directory, color_mode, shuffle):
+    """
+    Creates an unbatched tf.data.Dataset of (image, label) pairs from a directory that has a subfolder of images for
+    each class. Returns the dataset and the list of class names. The order of the dataset is deterministic, so that
+    it can be cached; a random shuffle is applied by preprocessing after the cache.
+    """
+    channels = COLOR_MODE_CHANNELS[color_mode]
+
+    file_paths, labels, class_names = _index_directory(directory, shuffle)
+
+    def load_image(path, label):
+        return _decode_image(tf.io.read_file(path), channels, LOAD_IMAGE_SIZE), label
+
+    dataset = tf.data.Dataset.from_tensor_slices((tf.constant(file_paths, dtype=tf.string),
+                                                  tf.constant(labels, dtype=tf.int32)))
+    dataset = dataset.map(load_image, num_parallel_calls=tf.data.AUTOTUNE)
+
+    return dataset, class_names
+
 
 class TFCustomImageClassificationDataset(ImageClassificationDataset, TFDataset):
     """
@@ -62,16 +268,29 @@ class TFCustomImageClassificationDataset(ImageClassificationDataset, TFDataset):
                            each class.
         dataset_name (str): optional; Name of the dataset. If no dataset name is given, the dataset_dir folder name
                             will be used as the dataset name.
-        color_mode (str): optional; Specify the color mode as "greyscale", "rgb", or "rgba". Defaults to "rgb".
+        color_mode (str): optional; Specify the color mode as "grayscale", "rgb", or "rgba". Defaults to "rgb".
         shuffle_files (bool): optional; Whether to shuffle the data. Defaults to True.
         seed (int): optional; Random seed for shuffling
+        persist_cache (bool): optional; Whether to persist the preprocessed images to disk using a tf.data snapshot
+                              in the dataset directory, so that subsequent runs can skip decoding and resizing.
+                              Defaults to True.
+        cache_ram_budget (int): optional; Number of bytes of RAM that may be used to cache the preprocessed images.
+                                If the estimated size of a preprocessed subset fits in this budget, it is cached in
+                                memory instead of being persisted to disk. Defaults to None.
+        prefetch_device (str): optional; Device (like '/GPU:0') to prefetch the preprocessed batches to when a model
+                               trains or evaluates on the dataset, so that copying the next batch overlaps with the
+                               training step. This is only done when a GPU is available and no
+                               tf.distribute.Strategy is in scope, since the strategy does its own prefetching.
+                               Defaults to None, which keeps the prefetched batches in host memory.
 
     Raises:
         FileNotFoundError: if dataset directory does not exist
+        ValueError: if the color_mode is not supported
 
     """
 
-    def __init__(self, dataset_dir, dataset_name=None, color_mode="rgb", shuffle_files=True, seed=None, **kwargs):
+    def __init__(self, dataset_dir, dataset_name=None, color_mode="rgb", shuffle_files=True, seed=None,
+                 persist_cache=True, cache_ram_budget=None, prefetch_device=None, **kwargs):
         """
         Class constructor
         """
@@ -91,56 +310,68 @@ class TFCustomImageClassificationDataset(ImageClassificationDataset, TFDataset):
         }
         self._preprocessed = None
         self._seed = seed
+        self._color_mode = color_mode
+        self._shuffle_files = shuffle_files
+        self._persist_cache = persist_cache
+        self._cache_ram_budget = cache_ram_budget
+        self._prefetch_device = prefetch_device
 
         self._train_pct = 1.0
         self._val_pct = 0
         self._test_pct = 0
         self._validation_type = None
+        self._dataset = None
         self._train_subset = None
         self._validation_subset = None
         self._test_subset = None
+        self._loaded = False
+
+        # Set by preprocessing: the cached uint8 images of the full dataset, and the function that shuffles, batches,
+        # and rescales them, so that shuffle_split can split the images before they are batched
+        self._cached_dataset = None
+        self._batch_cached_images = None
+
+        if color_mode not in COLOR_MODE_CHANNELS:
+            raise ValueError("color_mode must be one of {}. Received: {}".format(list(COLOR_MODE_CHANNELS.keys()),
+                                                                                 color_mode))
 
         # Determine which layout the images are in - category folders or train/test folders
         # The validation_type will be None for the former and "defined_split" for the latter
         if os.path.exists(os.path.join(dataset_dir, 'train')):
-            self._validation_type = 'defined_split'
-            self._train_subset = tf.keras.utils.image_dataset_from_directory(
-                os.path.join(dataset_dir, 'train'),
-                batch_size=None,
-                shuffle=shuffle_files,
-                seed=self._seed,
-                color_mode=color_mode)
-            self._dataset = self._train_subset
-            self._class_names = self._dataset.class_names
-            if os.path.exists(os.path.join(dataset_dir, 'validation')) or \
-                    os.path.exists(os.path.join(dataset_dir, 'test')):
-                if os.path.exists(os.path.join(dataset_dir, 'validation')):
-                    self._validation_subset = tf.keras.utils.image_dataset_from_directory(
-                        os.path.join(dataset_dir, 'validation'),
-                        batch_size=None,
-                        shuffle=shuffle_files,
-                        seed=self._seed,
-                        color_mode=color_mode)
-                    self._dataset = self._dataset.concatenate(self._validation_subset)
-                if os.path.exists(os.path.join(dataset_dir, 'test')):
-                    self._test_subset = tf.keras.utils.image_dataset_from_directory(
-                        os.path.join(dataset_dir, 'test'),
-                        batch_size=None,
-                        shuffle=shuffle_files,
-                        seed=self._seed,
-                        color_mode=color_mode)
-                    self._dataset = self._dataset.concatenate(self._test_subset)
-            else:
+            if not os.path.exists(os.path.join(dataset_dir, 'validation')) and \
+                    not os.path.exists(os.path.join(dataset_dir, 'test')):
                 raise FileNotFoundError("Found a 'train' directory, but not a 'test' or 'validation' directory.")
+            self._validation_type = 'defined_split'
+            self._class_names = _enumerate_classes(os.path.join(dataset_dir, 'train'))
         else:
             self._validation_type = None
-            self._dataset = tf.keras.utils.image_dataset_from_directory(
-                self._dataset_dir,
-                batch_size=None,
-                shuffle=shuffle_files,
-                seed=self._seed,
-                color_mode=color_mode)
-            self._class_names = self._dataset.class_names
+            self._class_names = _enumerate_classes(dataset_dir)
+
+    def _load(self):
+        """
+        Creates the datasets from the image files. This is done the first time that the datasets are needed, so that
+        getting the class names or info does not have to list all of the image files.
+        """
+        if self._loaded:
+            return
+
+        dataset_dir = self._dataset_dir
+        if self._validation_type == 'defined_split':
+            self._train_subset, self._class_names = _image_dataset_from_directory(
+                os.path.join(dataset_dir, 'train'), self._color_mode, self._shuffle_files)
+            self._dataset = self._train_subset
+            if os.path.exists(os.path.join(dataset_dir, 'validation')):
+                self._validation_subset, _ = _image_dataset_from_directory(
+                    os.path.join(dataset_dir, 'validation'), self._color_mode, self._shuffle_files)
+                self._dataset = self._dataset.concatenate(self._validation_subset)
+            if os.path.exists(os.path.join(dataset_dir, 'test')):
+                self._test_subset, _ = _image_dataset_from_directory(
+                    os.path.join(dataset_dir, 'test'), self._color_mode, self._shuffle_files)
+                self._dataset = self._dataset.concatenate(self._test_subset)
+        else:
+            self._dataset, self._class_names = _image_dataset_from_directory(
+                dataset_dir, self._color_mode, self._shuffle_files)
+        self._loaded = True
 
     @property
     def class_names(self):
@@ -161,9 +392,156 @@ class TFCustomImageClassificationDataset(ImageClassificationDataset, TFDataset):
         """
         Returns the framework dataset object (tf.data.Dataset)
         """
+        self._load()
         return self._dataset
 
-    def preprocess(self, image_size, batch_size, add_aug=None, preprocessor=None):
+    @property
+    def train_subset(self):
+        """
+        A subset of the dataset used for training
+        """
+        self._load()
+        return self._train_subset
+
+    @property
+    def validation_subset(self):
+        """
+        A subset of the dataset used for validation/evaluation
+        """
+        self._load()
+        return self._validation_subset
+
+    @property
+    def test_subset(self):
+        """
+        A subset of the dataset held out for final testing/evaluation
+        """
+        self._load()
+        return self._test_subset
+
+    def get_batch(self, subset='all'):
+        """
+        Get a single batch of images and labels from the dataset.
+
+            Args:
+                subset (str): default "all", can also be "train", "validation", or "test"
+
+            Returns:
+                (examples, labels)
+
+            Raises:
+                ValueError: if the dataset is not defined yet or the given subset is not valid
+        """
+        self._load()
+        return TFDataset.get_batch(self, subset)
+
+    def shuffle_split(self, train_pct=.75, val_pct=.25, test_pct=0., shuffle_files=True, seed=None):
+        """
+        Randomly split the dataset into train, validation, and test subsets with a pseudo-random seed option.
+
+            Args:
+                train_pct (float): default .75, percentage of dataset to use for training
+                val_pct (float):  default .25, percentage of dataset to use for validation
+                test_pct (float): default 0.0, percentage of dataset to use for testing
+                shuffle_files (bool): default True, optionally control whether shuffling occurs
+                seed (None or int): default None, can be set for pseudo-randomization
+
+            Raises:
+                ValueError: if percentage input args are not floats or sum to greater than 1
+        """
+        self._load()
+        if not self._preprocessed or self._cached_dataset is None or int(self._cached_dataset.cardinality()) < 0:
+            TFDataset.shuffle_split(self, train_pct, val_pct, test_pct, shuffle_files, seed)
+            return
+
+        if not (isinstance(train_pct, float) and isinstance(val_pct, float) and isinstance(test_pct, float)):
+            raise ValueError("Percentage arguments must be floats.")
+        if train_pct + val_pct + test_pct > 1.0:
+            raise ValueError("Sum of percentage arguments must be less than or equal to 1.")
+
+        # The preprocessed dataset is split from its cached uint8 images, instead of unbatching and caching the
+        # float32 batches. Each image is assigned to a subset using a random permutation, and the subsets filter the
+        # cached images, so that the images don't need to be held in a shuffle buffer. The subsets have a whole
+        # number of batches, which is the same as splitting the batches of the dataset.
+        num_images = int(self._cached_dataset.cardinality())
+        batch_size = self._preprocessed['batch_size']
+        length = math.ceil(num_images / batch_size)
+        train_size = min(int(train_pct * length) * batch_size, num_images)
+        val_size = min(int(val_pct * length) * batch_size, num_images - train_size)
+
+        order = np.random.RandomState(seed).permutation(num_images) if shuffle_files else np.arange(num_images)
+        subset_ids = np.full(num_images, 2, dtype=np.int32)
+        subset_ids[order[:train_size]] = 0
+        subset_ids[order[train_size:train_size + val_size]] = 1
+        subset_ids = tf.constant(subset_ids)
+
+        def get_subset(subset_id, size, training):
+            subset = self._cached_dataset.enumerate()
+            subset = subset.filter(lambda i, element: tf.equal(tf.gather(subset_ids, i), subset_id))
+            subset = subset.map(lambda i, element: element)
+            subset = subset.apply(tf.data.experimental.assert_cardinality(size))
+            return self._batch_cached_images(subset, training)
+
+        self._train_subset = get_subset(0, train_size, True)
+        self._validation_subset = get_subset(1, val_size, False)
+        if test_pct:
+            self._test_subset = get_subset(2, num_images - train_size - val_size, False)
+        else:
+            self._test_subset = None
+        self._validation_type = 'shuffle_split'
+
+    def _prefetch_to_device(self, dataset):
+        """
+        Prefetches the batches of a preprocessed dataset to the prefetch device. This has to be the last
+        transformation in the pipeline, so it is not applied by preprocessing or by the dataset and subset properties
+        (which may be transformed further, e.g. by shuffle_split or get_inc_dataloaders). The models apply it to the
+        dataset that they pass to fit or evaluate.
+        """
+        if dataset is None or not self._preprocessed or not self._prefetch_device or tf.distribute.has_strategy() or \
+                not tf.config.list_physical_devices('GPU'):
+            return dataset
+
+        return dataset.apply(tf.data.experimental.prefetch_to_device(self._prefetch_device, buffer_size=2))
+
+    def _cache(self, dataset, subset, image_size):
+        """
+        Caches the resized uint8 (but not yet batched) images of a subset. The images are cached in memory when the
+        estimated size fits in the RAM budget, otherwise they are persisted to disk using a tf.data snapshot so that
+        the decoding and resizing is only done once across processes. If the snapshot folder can't be written (for
+        example, a read-only dataset directory), the images are cached in memory.
+        """
+        channels = COLOR_MODE_CHANNELS[self._info["color_mode"]]
+        try:
+            estimated_bytes = len(dataset) * image_size * image_size * channels
+        except TypeError:
+            # The cardinality of the dataset is unknown
+            estimated_bytes = None
+
+        if not self._persist_cache or (self._cache_ram_budget is not None and estimated_bytes is not None and
+                                       estimated_bytes <= self._cache_ram_budget):
+            return dataset.cache()
+
+        snapshot_dir = os.path.join(self._dataset_dir, ".tlt_snapshot", subset)
+        try:
+            os.makedirs(snapshot_dir, exist_ok=True)
+        except OSError:
+            return dataset.cache()
+        if not os.access(snapshot_dir, os.W_OK):
+            return dataset.cache()
+
+        cardinality = int(dataset.cardinality())
+        if hasattr(tf.data.Dataset, "snapshot"):
+            dataset = dataset.snapshot(path=snapshot_dir, compression="AUTO")
+        else:
+            dataset = dataset.apply(tf.data.experimental.snapshot(snapshot_dir, compression="AUTO"))
+
+        # Keep the cardinality so that the length of the dataset is still known after the snapshot
+        if cardinality >= 0:
+            dataset = dataset.apply(tf.data.experimental.assert_cardinality(cardinality))
+
+        return dataset
+
+    def preprocess(self, image_size, batch_size, add_aug=None, preprocessor=None, jit_compile=False, resize_mode="pad"):
         """
         Preprocess the dataset to convert to float32, resize, normalize, and batch the images
 
@@ -180,6 +558,14 @@ class TFCustomImageClassificationDataset(ImageClassificationDataset, TFDataset):
                                              Keras Applications models, which have model-specific preprocessors;
                                              otherwise, use None (the default) to apply generic normalization and
                                              resizing
+                jit_compile (bool): optional; Compile the resizing and normalization functions with XLA, so that
+                                    their ops are fused into fewer kernels. The image size is fixed, so the functions
+                                    are only compiled once per input shape. Defaults to False.
+                resize_mode (str): optional; How the images are resized to the square image size. The images are
+                                   already stretched to 256x256 when they are loaded, so "pad" and "stretch" both
+                                   resize them directly to the image size ("pad" has no padding to add to a square
+                                   image). "crop" resizes to 32 pixels larger than the image size and then takes a
+                                   center crop, which trims the edges of the images. Defaults to "pad".
 
             Raises:
                 ValueError: if the dataset is not defined or has already been processed
@@ -190,8 +576,12 @@ class TFCustomImageClassificationDataset(ImageClassificationDataset, TFDataset):
             raise ValueError("batch_size should be an positive integer")
         if not isinstance(image_size, int) or image_size < 1:
             raise ValueError("image_size should be an positive integer")
+        self._load()
         if not (self._dataset or self._train_subset or self._validation_subset or self._test_subset):
             raise ValueError("Unable to preprocess, because the dataset hasn't been defined.")
+        if resize_mode not in ["pad", "stretch", "crop"]:
+            raise ValueError("Unsupported resize_mode: {}. Supported resize modes are: pad, stretch, crop".format(
+                resize_mode))
 
         if add_aug is not None:
             aug_dict = {
@@ -213,25 +603,61 @@ class TFCustomImageClassificationDataset(ImageClassificationDataset, TFDataset):
                         Supported augmentations are {}".format(option, aug_list))
                 data_augmentation.add(aug_dict[option])
 
-        normalization_layer = tf.keras.layers.Rescaling(1. / 255)
-
         def preprocess_image(image, label):
-            image = tf.image.resize_with_pad(image, image_size, image_size)
-            if preprocessor is None:
-                image = normalization_layer(image)
+            if resize_mode == "stretch":
+                image = tf.image.resize(image, [image_size, image_size], method='bilinear', antialias=False)
+            elif resize_mode == "crop":
+                image = tf.image.resize(image, [image_size + 32, image_size + 32], method='bilinear', antialias=False)
+                image = tf.image.crop_to_bounding_box(image, 16, 16, image_size, image_size)
+            else:
+                image = tf.image.resize_with_pad(image, image_size, image_size)
+            # Keep the resized images as uint8 so that the cache is 4x smaller than with float32
+            image = tf.saturate_cast(tf.round(image), tf.uint8)
             return (image, label)
 
-        # Get the non-None splits
-        split_list = ['_dataset', '_train_subset', '_validation_subset', '_test_subset']
-        subsets = [s for s in split_list if getattr(self, s, None)]
-        for subset in subsets:
-            setattr(self, subset, getattr(self, subset).map(preprocess_image))
-            if preprocessor:
-                setattr(self, subset, getattr(self, subset).map(lambda x, y: (preprocessor(x), y)))
-            setattr(self, subset, getattr(self, subset).cache())
-            setattr(self, subset, getattr(self, subset).batch(batch_size))
-            setattr(self, subset, getattr(self, subset).prefetch(tf.data.AUTOTUNE))
-            if add_aug is not None and subset in ['_dataset', '_train_subset']:
-                setattr(self, subset, getattr(self, subset).map(lambda x, y: (data_augmentation(x, training=True), y),
-                                                                num_parallel_calls=tf.data.AUTOTUNE))
+        def preprocess_batch(images, labels):
+            # Rescaling is done on the whole batch with a cast and a float32 constant multiply, instead of per image
+            # with a Keras layer. With jit_compile, XLA fuses the two into a single kernel.
+            images = tf.cast(images, tf.float32)
+            if preprocessor is None:
+                images = images * tf.constant(1. / 255, dtype=tf.float32)
+            else:
+                images = preprocessor(images)
+            return (images, labels)
+
+        # Trace the preprocessing functions once and share them across the subsets
+        preprocess_image = tf.function(preprocess_image, jit_compile=True if jit_compile else None)
+        preprocess_batch = tf.function(preprocess_batch, jit_compile=True if jit_compile else None)
+
+        def cache_images(dataset, subset):
+            dataset = dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
+            return self._cache(dataset, subset, image_size)
+
+        def batch_images(dataset, augment):
+            if self._shuffle_files:
+                # Shuffle after the cache, so that the cached images are the same in every run
+                dataset = dataset.shuffle(buffer_size=1024, seed=self._seed)
+            dataset = dataset.batch(batch_size, num_parallel_calls=tf.data.AUTOTUNE)
+            dataset = dataset.map(preprocess_batch, num_parallel_calls=tf.data.AUTOTUNE)
+            dataset = dataset.prefetch(tf.data.AUTOTUNE)
+            if augment:
+                dataset = dataset.map(lambda x, y: (data_augmentation(x, training=True), y),
+                                      num_parallel_calls=tf.data.AUTOTUNE)
+            return dataset
+
+        def apply_preprocessing(dataset, subset, augment):
+            return batch_images(cache_images(dataset, subset), augment)
+
+        # Augmentation is only applied to the full dataset and the training subset
+        if self._dataset is not None:
+            self._cached_dataset = cache_images(self._dataset, 'dataset')
+            self._batch_cached_images = lambda dataset, training: batch_images(dataset,
+                                                                               training and add_aug is not None)
+            self._dataset = batch_images(self._cached_dataset, add_aug is not None)
+        if self._train_subset is not None:
+            self._train_subset = apply_preprocessing(self._train_subset, 'train_subset', add_aug is not None)
+        if self._validation_subset is not None:
+            self._validation_subset = apply_preprocessing(self._validation_subset, 'validation_subset', False)
+        if self._test_subset is not None:
+            self._test_subset = apply_preprocessing(self._test_subset, 'test_subset', False)
         self._preprocessed = {'image_size': image_size, 'batch_size': batch_size}
@@ -18,7 +18,16 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
+import hashlib
+import os
+import sys
+import tempfile
+import numpy as np
 import torch
+import torchvision.transforms as T
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from torchvision.io import ImageReadMode, decode_jpeg, read_file
 
 from tlt.datasets.pytorch_dataset import PyTorchDataset
 from tlt.datasets.image_classification.image_classification_dataset import ImageClassificationDataset
@@ -26,14 +35,261 @@ from downloader.datasets import DataDownloader
 
 DATASETS = ["CIFAR10", "Food101", "Country211", "DTD", "FGVCAircraft", "RenderedSST2"]
 
+# Paths, relative to the dataset directory, that exist after torchvision has downloaded and extracted each dataset
+DOWNLOAD_MARKERS = {
+    "CIFAR10": ["cifar-10-batches-py/batches.meta"],
+    "Food101": ["food-101/meta", "food-101/images"],
+    "Country211": ["country211/train", "country211/valid", "country211/test"],
+    "DTD": ["dtd/dtd/images", "dtd/dtd/labels"],
+    "FGVCAircraft": ["fgvc-aircraft-2013b/data/images"],
+    "RenderedSST2": ["rendered-sst2/train", "rendered-sst2/valid", "rendered-sst2/test"]
+}
+
+
+def _already_present(dataset_dir, dataset_name):
+    """
+    Returns True if the torchvision dataset has already been downloaded and extracted to the dataset directory
+    """
+    return all(os.path.exists(os.path.join(dataset_dir, marker)) for marker in DOWNLOAD_MARKERS[dataset_name])
+
+
+class _InMemoryDataset(torch.utils.data.Dataset):
+    """
+    Wraps a dataset and keeps all of its decoded samples in memory, so that the images are only read and decoded
+    once. The transform is applied when a sample is accessed, so it can still include random augmentation.
+    """
+
+    def __init__(self, samples, classes=None):
+        self._samples = samples
+        self.classes = classes
+        self.transform = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def __getitem__(self, idx):
+        image, label = self._samples[idx]
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, label
+
+
+def _estimate_sample_bytes(sample):
+    """
+    Estimates the number of bytes used by an (image, label) sample
+    """
+    image = sample[0]
+    if isinstance(image, Image.Image):
+        return image.width * image.height * len(image.getbands())
+    elif isinstance(image, torch.Tensor):
+        return image.element_size() * image.nelement()
+    elif isinstance(image, np.ndarray):
+        return image.nbytes
+    return sys.getsizeof(image)
+
+
+class _PersistentDataset(torch.utils.data.Dataset):
+    """
+    Wraps a dataset that has deterministic transforms, and stores the transformed samples in a directory as numpy
+    arrays (images.npy and labels.npy). The arrays are written once, and then memory mapped, so that later epochs and
+    runs read the transformed images without decoding or transforming them again.
+    """
+
+    def __init__(self, dataset, cache_path, num_workers=0):
+        self._dataset = dataset
+        self._images_path = os.path.join(cache_path, 'images.npy')
+        self._labels_path = os.path.join(cache_path, 'labels.npy')
+
+        if not os.path.isfile(self._images_path) or not os.path.isfile(self._labels_path):
+            self._write_cache(cache_path, num_workers)
+
+        self._images = None
+        self._labels = np.load(self._labels_path)
+
+    def _write_cache(self, cache_path, num_workers):
+        """
+        Transforms every sample of the dataset and writes the results to a temporary directory, which are then moved
+        to the cache path so that a partially written cache is never read
+        """
+        os.makedirs(cache_path, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=cache_path)
+        length = len(self._dataset)
+        images = None
+        labels = np.empty(length, dtype=np.int64)
+        index = 0
+        data_loader = torch.utils.data.DataLoader(self._dataset, batch_size=64, shuffle=False, num_workers=num_workers)
+        for image_batch, label_batch in data_loader:
+            if images is None:
+                images = np.lib.format.open_memmap(os.path.join(tmp_dir, 'images.npy'), mode='w+', dtype=np.float32,
+                                                   shape=(length,) + tuple(image_batch.shape[1:]))
+            images[index:index + len(image_batch)] = image_batch.numpy()
+            labels[index:index + len(label_batch)] = label_batch.numpy()
+            index += len(image_batch)
+        if images is None:
+            # The dataset is empty, so there is no image shape to create the memory map with
+            np.save(os.path.join(tmp_dir, 'images.npy'), np.empty((0,), dtype=np.float32))
+        else:
+            images.flush()
+            del images
+        np.save(os.path.join(tmp_dir, 'labels.npy'), labels)
+        os.replace(os.path.join(tmp_dir, 'images.npy'), self._images_path)
+        os.replace(os.path.join(tmp_dir, 'labels.npy'), self._labels_path)
+        os.rmdir(tmp_dir)
+
+    def __getstate__(self):
+        # Data loader workers reopen the memory map instead of getting a pickled copy of the images
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __getattr__(self, name):
+        # Attributes like 'classes' come from the wrapped dataset
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._dataset, name)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __getitem__(self, idx):
+        if self._images is None:
+            # Copy-on-write mode gives writable arrays, so the tensor is a view of the memory map
+            self._images = np.load(self._images_path, mmap_mode='c')
+        return torch.from_numpy(self._images[idx]), int(self._labels[idx])
+
+
+class _BiasedConcatDataset(torch.utils.data.ConcatDataset):
+    """
+    A ConcatDataset where one of the datasets has most of the samples. Indices that belong to the large dataset are
+    found with a range check, instead of a binary search over the cumulative sizes.
+    """
+
+    def __init__(self, datasets, large_index):
+        torch.utils.data.ConcatDataset.__init__(self, datasets)
+        self._large_dataset = self.datasets[large_index]
+        self._large_start = self.cumulative_sizes[large_index - 1] if large_index > 0 else 0
+        self._large_end = self.cumulative_sizes[large_index]
+
+    def __getitem__(self, idx):
+        if self._large_start <= idx < self._large_end:
+            return self._large_dataset[idx - self._large_start]
+        return torch.utils.data.ConcatDataset.__getitem__(self, idx)
+
+
+def _concat_datasets(datasets):
+    """
+    Concatenates the datasets, using a _BiasedConcatDataset when one dataset has more than 95% of the samples
+    """
+    sizes = [len(d) for d in datasets]
+    large_index = int(np.argmax(sizes))
+    if sum(sizes) > 0 and sizes[large_index] / sum(sizes) > 0.95:
+        return _BiasedConcatDataset(datasets, large_index)
+    return torch.utils.data.ConcatDataset(datasets)
+
+
+def _jpeg_samples(dataset):
+    """
+    Returns the list of (path, label) samples of a torchvision dataset that is stored as JPEG files, or None if the
+    dataset is stored in another way
+    """
+    if hasattr(dataset, 'samples'):
+        samples = list(dataset.samples)
+    elif hasattr(dataset, '_image_files') and hasattr(dataset, '_labels'):
+        samples = list(zip(dataset._image_files, dataset._labels))
+    else:
+        return None
+    if not all(str(path).lower().endswith(('.jpg', '.jpeg')) for path, _ in samples):
+        return None
+    return samples
+
+
+class _EncodedJPEGDataset(torch.utils.data.Dataset):
+    """
+    Returns the undecoded contents of JPEG files as uint8 tensors, so that the images can be decoded on a GPU
+    """
+
+    def __init__(self, samples, classes):
+        self._samples = samples
+        self.classes = classes
+        self.transform = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def __getitem__(self, idx):
+        path, label = self._samples[idx]
+        return read_file(str(path)), label
+
+
+def _collate_encoded(batch):
+    """
+    Collates samples of encoded images, which have different lengths, into a list of images and a tensor of labels
+    """
+    return [data for data, _ in batch], torch.tensor([label for _, label in batch])
+
+
+class _DeviceDecodeLoader():
+    """
+    Wraps a DataLoader of encoded JPEG images. The data loader workers only read the files, and the images are decoded
+    and transformed on the CUDA device in the main process.
+    """
+
+    def __init__(self, loader, get_transform, device='cuda'):
+        self._loader = loader
+        self._get_transform = get_transform
+        self._device = device
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._loader, name)
+
+    def __len__(self):
+        return len(self._loader)
+
+    def __iter__(self):
+        transform = self._get_transform()
+        for encoded, labels in self._loader:
+            images = [decode_jpeg(data, mode=ImageReadMode.RGB, device=self._device) for data in encoded]
+            if transform is not None:
+                images = [transform(image) for image in images]
+            yield torch.stack(images), labels
+
 
 class TorchvisionImageClassificationDataset(ImageClassificationDataset, PyTorchDataset):
     """
     An image classification dataset from the torchvision catalog
+
+    Args:
+        dataset_dir (str): Directory where the data is located or will be downloaded to
+        dataset_name (str): Name of the torchvision dataset
+        split (list[str]): optional; Splits to load ('train', 'validation', and/or 'test'). Defaults to ['train'].
+        download (bool): optional; Whether to download the dataset if it is not already in dataset_dir. Defaults to
+                         True.
+        num_workers (int): optional; Number of processes to use for data loading. Defaults to None, which uses half of
+                           the CPUs (at least 2). Use 0 to load data in the main process.
+        shuffle_files (bool): optional; Whether to shuffle the data. Defaults to True.
+        cache_dir (str): optional; Directory to store the preprocessed images in. When given, and preprocessing does
+                         not use augmentation, the resized and normalized images are written to this directory once
+                         and memory mapped afterwards, instead of being decoded and transformed every epoch.
+                         Defaults to None.
+        in_memory (bool): optional; Whether to load all of the decoded images into memory when the dataset is created,
+                          so that they are not read and decoded again every epoch. Defaults to False.
+        in_memory_max_bytes (int): optional; Maximum number of bytes that the images loaded in memory are estimated
+                                   to use. If the estimate is larger, the images are not loaded into memory.
+                                   Defaults to None (no limit).
+        gpu_decode (bool): optional; Whether to decode JPEG images on the GPU with nvJPEG. The data loader workers
+                           only read the files, and the images are decoded, transformed, and returned as CUDA
+                           tensors. If CUDA is not available or the dataset is not stored as JPEG files, the images are
+                           decoded on the CPU. Only the data loaders decode the images; the dataset and its subsets
+                           return the encoded files, so this cannot be used with distributed training. This is only
+                           faster for a model that runs on a CUDA device. The PyTorch models train on the CPU, so
+                           the decoded batches would be copied back to the host, which is slower than decoding on
+                           the CPU. Cannot be used with cache_dir or in_memory. Defaults to False.
     """
 
-    def __init__(self, dataset_dir, dataset_name, split=['train'], download=True, num_workers=0, shuffle_files=True,
-                 **kwargs):
+    def __init__(self, dataset_dir, dataset_name, split=['train'], download=True, num_workers=None, shuffle_files=True,
+                 cache_dir=None, in_memory=False, in_memory_max_bytes=None, gpu_decode=False, **kwargs):
         """
         Class constructor
         """
@@ -44,66 +300,68 @@ class TorchvisionImageClassificationDataset(ImageClassificationDataset, PyTorchD
                 raise ValueError('Split argument can only contain these strings: train, validation, test.')
         if dataset_name not in DATASETS:
             raise ValueError("Dataset name is not supported. Choose from: {}".format(DATASETS))
+        if gpu_decode and (cache_dir or in_memory):
+            raise ValueError("gpu_decode cannot be used with cache_dir or in_memory.")
+        if gpu_decode and kwargs.get("distributed", None):
+            raise ValueError("gpu_decode cannot be used with distributed training.")
 
         ImageClassificationDataset.__init__(self, dataset_dir, dataset_name)
-        self._num_workers = num_workers
+        self._num_workers = num_workers if num_workers is not None else max(2, (os.cpu_count() or 1) // 2)
         self._shuffle = shuffle_files
+        self._split = split
+        self._cache_dir = cache_dir
         self._preprocessed = {}
         self._dataset = None
         self._train_indices = None
         self._validation_indices = None
         self._test_indices = None
+        self._gpu_decode = False
         self._distributed = kwargs.get("distributed", None)
 
-        downloader = DataDownloader(dataset_name, dataset_dir=dataset_dir, catalog='torchvision')
+        # Torchvision verifies existing files again when it is asked to download, so only ask when they are missing
+        self._download = download and not _already_present(dataset_dir, dataset_name)
+        downloader = DataDownloader(dataset_name, dataset_dir=dataset_dir, catalog='torchvision',
+                                    download=self._download)
+
+        # The splits of a torchvision dataset usually come from the same archive, so the first split is loaded on its
+        # own to download and extract it once. The remaining splits only have to read their metadata from disk, so
+        # they are loaded in parallel.
+        split_data = {split[0]: self._load_split(downloader, split[0])}
+        if len(split) > 1:
+            with ThreadPoolExecutor(max_workers=len(split) - 1) as executor:
+                futures = {s: executor.submit(self._load_split, downloader, s) for s in split[1:]}
+                split_data.update({s: future.result() for s, future in futures.items()})
+
+        if gpu_decode:
+            jpeg_samples = {s: _jpeg_samples(data) for s, data in split_data.items()}
+            if not torch.cuda.is_available():
+                print("WARNING: CUDA is not available, so the images will be decoded on the CPU")
+            elif any(samples is None for samples in jpeg_samples.values()):
+                print("WARNING: The {} dataset is not stored as JPEG files, so the images will be decoded on the "
+                      "CPU".format(dataset_name))
+            else:
+                split_data = {s: _EncodedJPEGDataset(jpeg_samples[s], data.classes) for s, data in split_data.items()}
+                self._gpu_decode = True
+
         if len(split) == 1:
             # If there is only one split, use it for _dataset and do not define any indices
-            if split[0] == 'train':
-                self._dataset = downloader.download(split='train')
-            elif split[0] == 'validation':
-                try:
-                    self._dataset = downloader.download(split='val')
-                except TypeError:
-                    raise ValueError('No validation split was found for this dataset: {}'.format(dataset_name))
-            elif split[0] == 'test':
-                try:
-                    self._dataset = downloader.download(split='test')
-                except TypeError:
-                    raise ValueError('No test split was found for this dataset: {}'.format(dataset_name))
+            self._dataset = split_data[split[0]]
             self._validation_type = None  # Train & evaluate on the whole dataset
         else:
             # If there are multiple splits, concatenate them for _dataset and define indices
-            if 'train' in split:
-                self._dataset = downloader.download(split='train')
-                self._train_indices = range(len(self._dataset))
-            if 'validation' in split:
-                try:
-                    validation_data = downloader.download(split='val')
-                    validation_length = len(validation_data)
-                    if self._dataset:
-                        current_length = len(self._dataset)
-                        self._dataset = torch.utils.data.ConcatDataset([self._dataset, validation_data])
-                        self._validation_indices = range(current_length, current_length + validation_length)
-                    else:
-                        self._dataset = validation_data
-                        self._validation_indices = range(validation_length)
-                except ValueError:
-                    raise ValueError('No validation split was found for this dataset: {}'.format(dataset_name))
-            if 'test' in split:
-                try:
-                    test_data = downloader.download(split='test')
-                except ValueError:
-                    raise ValueError('No test split was found for this dataset: {}'.format(dataset_name))
-                finally:
-                    test_length = len(test_data)
-                    if self._dataset:
-                        current_length = len(self._dataset)
-                        self._dataset = torch.utils.data.ConcatDataset([self._dataset, test_data])
-                        self._test_indices = range(current_length, current_length + test_length)
-                    else:
-                        self._dataset = test_data
-                        self._validation_indices = range(test_length)
+            split_names = [s for s in ['train', 'validation', 'test'] if s in split_data]
+            offsets = np.cumsum([0] + [len(split_data[s]) for s in split_names])
+            split_indices = {s: np.arange(offsets[i], offsets[i + 1], dtype=np.int64)
+                             for i, s in enumerate(split_names)}
+            self._train_indices = split_indices.get('train')
+            self._validation_indices = split_indices.get('validation')
+            self._test_indices = split_indices.get('test')
+            self._dataset = _concat_datasets([split_data[s] for s in split_names])
             self._validation_type = 'defined_split'  # Defined by user or torchvision
+
+        if in_memory:
+            self._load_in_memory(in_memory_max_bytes)
+
         self._info = {'name': dataset_name, 'size': len(self._dataset), 'distributed': self._distributed}
         self._make_data_loaders(batch_size=1)
 
@@ -127,3 +385,92 @@ class TorchvisionImageClassificationDataset(ImageClassificationDataset, PyTorchD
         Returns the framework dataset object (torch.utils.data.Dataset)
         """
         return self._dataset
+
+    def _loader_args(self):
+        """
+        Returns additional DataLoader arguments, which batch encoded images when they are decoded on the GPU
+        """
+        args = PyTorchDataset._loader_args(self)
+        if self._gpu_decode:
+            args['collate_fn'] = _collate_encoded
+        return args
+
+    def _make_data_loaders(self, batch_size, generator=None):
+        """Make data loaders, which decode the images on the GPU if gpu_decode is enabled"""
+        PyTorchDataset._make_data_loaders(self, batch_size, generator)
+        if self._gpu_decode:
+            def wrap(data_loader):
+                return _DeviceDecodeLoader(data_loader, self._device_transform) if data_loader is not None else None
+
+            self._data_loader = wrap(self._data_loader)
+            self._train_loader = wrap(self._train_loader)
+            self._validation_loader = wrap(self._validation_loader)
+            self._test_loader = wrap(self._test_loader)
+
+    def _device_transform(self):
+        """
+        Returns the dataset's transform for decoded image tensors, which are converted to float instead of being
+        converted from PIL images
+        """
+        transform = getattr(self._dataset, 'transform', None)
+        if transform is None:
+            return None
+        return T.Compose([T.ConvertImageDtype(torch.float32) if isinstance(t, T.ToTensor) else t
+                          for t in transform.transforms])
+
+    def _load_split(self, downloader, split_name):
+        """
+        Returns the torchvision dataset for the given split: 'train', 'validation', or 'test'
+        """
+        if split_name == 'train':
+            return downloader.download(split='train')
+        try:
+            return downloader.download(split='val' if split_name == 'validation' else split_name)
+        except (TypeError, ValueError):
+            raise ValueError('No {} split was found for this dataset: {}'.format(split_name, self._dataset_name))
+
+    def _load_in_memory(self, max_bytes=None):
+        """
+        Replaces the dataset with an in-memory copy of its decoded samples, unless the estimated size is larger than
+        max_bytes
+        """
+        length = len(self._dataset)
+        if max_bytes is not None and _estimate_sample_bytes(self._dataset[0]) * length > max_bytes:
+            print("WARNING: The {} dataset is estimated to be larger than {} bytes, so it will not be loaded into "
+                  "memory".format(self._dataset_name, max_bytes))
+            return
+
+        # Reading and decoding the images is mostly I/O and native code, so threads can load samples in parallel
+        with ThreadPoolExecutor(max_workers=self._num_workers if self._num_workers > 0 else None) as executor:
+            samples = list(executor.map(self._dataset.__getitem__, range(length)))
+
+        self._dataset = _InMemoryDataset(samples, getattr(self._dataset, 'classes', None))
+
+    def preprocess(self, image_size='variable', batch_size=32, add_aug=None, **kwargs):
+        """
+        Preprocess the dataset to resize, normalize, and batch the images. Apply augmentation
+        if specified. If the dataset has a cache_dir and no augmentation is used, the preprocessed images are
+        cached on disk.
+
+            Args:
+                image_size (int or 'variable'): desired square image size (if 'variable', does not alter image size)
+                batch_size (int): desired batch size (default 32)
+                add_aug (None or list[str]): Choice of augmentations (RandomHorizontalFlip, RandomRotation) to be
+                                             applied during training
+                kwargs: optional; additional keyword arguments for Resize and Normalize transforms
+            Raises:
+                ValueError if the dataset is not defined or has already been processed
+        """
+        PyTorchDataset.preprocess(self, image_size, batch_size, add_aug, **kwargs)
+
+        # A concatenated dataset needs the transform to be set on each of the split datasets
+        if isinstance(self._dataset, torch.utils.data.ConcatDataset):
+            for split_dataset in self._dataset.datasets:
+                split_dataset.transform = self._dataset.transform
+
+        # Only deterministic transforms with a fixed image size can be cached
+        if self._cache_dir and add_aug is None and isinstance(image_size, int):
+            cache_key = '{}|{}|{}'.format(self._dataset_name, self._split, repr(self._dataset.transform))
+            cache_path = os.path.join(self._cache_dir, hashlib.sha256(cache_key.encode()).hexdigest())
+            self._dataset = _PersistentDataset(self._dataset, cache_path, self._num_workers)
+            self._make_data_loaders(batch_size=batch_size)
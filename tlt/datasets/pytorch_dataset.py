@@ -44,21 +44,30 @@ class PyTorchDataset(BaseDataset):
         """
         A subset of the dataset used for training
         """
-        return torch.utils.data.Subset(self._dataset, self._train_indices) if self._train_indices else None
+        return self._make_subset(self._train_indices)
 
     @property
     def validation_subset(self):
         """
         A subset of the dataset used for validation/evaluation
         """
-        return torch.utils.data.Subset(self._dataset, self._validation_indices) if self._validation_indices else None
+        return self._make_subset(self._validation_indices)
 
     @property
     def test_subset(self):
         """
         A subset of the dataset held out for final testing/evaluation
         """
-        return torch.utils.data.Subset(self._dataset, self._test_indices) if self._test_indices else None
+        return self._make_subset(self._test_indices)
+
+    def _make_subset(self, indices):
+        """
+        Returns a Subset of the dataset with the given indices (a list, range, or numpy array), or None if there are no
+        indices
+        """
+        if indices is None or len(indices) == 0:
+            return None
+        return torch.utils.data.Subset(self._dataset, indices)
 
     @property
     def data_loader(self):
@@ -157,29 +166,45 @@ class PyTorchDataset(BaseDataset):
             np.random.seed(worker_seed)
             random.seed(worker_seed)
 
+        loader_args = dict(shuffle=False, num_workers=self._num_workers, worker_init_fn=seed_worker,
+                           generator=generator)
+        loader_args.update(self._loader_args())
+
         if self._dataset:
-            self._data_loader = loader(self.dataset, batch_size=batch_size, shuffle=False,
-                                       num_workers=self._num_workers, worker_init_fn=seed_worker, generator=generator)
+            self._data_loader = loader(self.dataset, batch_size=batch_size, **loader_args)
         else:
             self._data_loader = None
-        if self._train_indices:
-            self._train_loader = loader(self.train_subset, batch_size=batch_size, shuffle=False,
-                                        num_workers=self._num_workers, worker_init_fn=seed_worker, generator=generator)
+        train_subset = self.train_subset
+        if train_subset is not None:
+            self._train_loader = loader(train_subset, batch_size=batch_size, **loader_args)
         else:
             self._train_loader = None
-        if self._validation_indices:
-            self._validation_loader = loader(self.validation_subset, batch_size=batch_size, shuffle=False,
-                                             num_workers=self._num_workers, worker_init_fn=seed_worker,
-                                             generator=generator)
+        validation_subset = self.validation_subset
+        if validation_subset is not None:
+            self._validation_loader = loader(validation_subset, batch_size=batch_size, **loader_args)
         else:
             self._validation_loader = None
-        if self._test_indices:
-            self._test_loader = loader(self.test_subset, batch_size=batch_size, shuffle=False,
-                                       num_workers=self._num_workers, worker_init_fn=seed_worker,
-                                       generator=generator)
+        test_subset = self.test_subset
+        if test_subset is not None:
+            self._test_loader = loader(test_subset, batch_size=batch_size, **loader_args)
         else:
             self._test_loader = None
 
+    def _loader_args(self):
+        """
+        Returns additional DataLoader arguments. Batches are pinned in memory when a GPU is available, and worker
+        processes are kept alive between epochs when workers are used.
+        """
+        args = {}
+        if torch.cuda.is_available():
+            args['pin_memory'] = True
+            if 'pin_memory_device' in inspect.signature(loader).parameters:
+                args['pin_memory_device'] = 'cuda'
+        if self._num_workers > 0:
+            args['persistent_workers'] = True
+            args['prefetch_factor'] = 4
+        return args
+
     def preprocess(self, image_size='variable', batch_size=32, add_aug=None, **kwargs):
         """
         Preprocess the dataset to resize, normalize, and batch the images. Apply augmentation
@@ -355,6 +355,11 @@ class PyTorchImageClassificationModel(ImageClassificationModel, PyTorchModel):
         self._check_train_inputs(output_dir, dataset, ImageClassificationDataset, epochs, initial_checkpoints,
                                  distributed, hostfile)
 
+        # Only the data loaders decode images on the GPU, and distributed training uses the subsets directly
+        if distributed and isinstance(dataset, TorchvisionImageClassificationDataset) and dataset._gpu_decode:
+            raise ValueError("Distributed training cannot be used with a dataset that decodes images on the GPU "
+                             "(gpu_decode=True)")
+
         dataset_num_classes = len(dataset.class_names)
 
         # Check that the number of classes matches the model outputs
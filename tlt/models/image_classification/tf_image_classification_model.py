@@ -33,6 +33,16 @@ from tlt.utils.types import FrameworkType, UseCaseType
 from tlt.distributed import TLT_DISTRIBUTED_DIR
 
 
+def _prefetch_to_device(dataset, data):
+    """
+    Returns the data prefetched to the prefetch device of a custom dataset. The prefetch has to be the last
+    transformation, so it is only applied to the data that is passed directly to Keras.
+    """
+    if data is not None and isinstance(dataset, TFCustomImageClassificationDataset):
+        return dataset._prefetch_to_device(data)
+    return data
+
+
 class TFImageClassificationModel(ImageClassificationModel, TFModel):
     """
     Class to represent a TF custom pretrained model for image classification
@@ -292,8 +302,8 @@ class TFImageClassificationModel(ImageClassificationModel, TFModel):
             finally:
                 self.cleanup_saved_objects_for_distributed()
         else:
-            history = self._model.fit(train_data, epochs=epochs, shuffle=shuffle_files, callbacks=train_callbacks,
-                                      validation_data=val_data)
+            history = self._model.fit(_prefetch_to_device(dataset, train_data), epochs=epochs, shuffle=shuffle_files,
+                                      callbacks=train_callbacks, validation_data=_prefetch_to_device(dataset, val_data))
             self._history = history.history
             return self._history
 
@@ -321,7 +331,7 @@ class TFImageClassificationModel(ImageClassificationModel, TFModel):
         if callbacks and not all(isinstance(callback, tf.keras.callbacks.Callback) for callback in callbacks):
             raise TypeError('Callbacks must be tf.keras.callbacks.Callback instances')
 
-        return self._model.evaluate(eval_dataset, callbacks=callbacks)
+        return self._model.evaluate(_prefetch_to_device(dataset, eval_dataset), callbacks=callbacks)
 
     def predict(self, input_samples, return_type='class', callbacks=None):
         """
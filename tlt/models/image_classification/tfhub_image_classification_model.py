@@ -24,7 +24,8 @@ import tensorflow as tf
 
 from downloader.models import ModelDownloader
 from tlt import TLT_BASE_DIR
-from tlt.models.image_classification.tf_image_classification_model import TFImageClassificationModel
+from tlt.models.image_classification.tf_image_classification_model import TFImageClassificationModel, \
+    _prefetch_to_device
 from tlt.datasets.image_classification.image_classification_dataset import ImageClassificationDataset
 from tlt.utils.file_utils import read_json_file
 
@@ -189,8 +190,8 @@ class TFHubImageClassificationModel(TFImageClassificationModel):
                                   kwargs.get('use_horovod'))
             self.cleanup_saved_objects_for_distributed()
         else:
-            history = self._model.fit(train_data, epochs=epochs, shuffle=shuffle_files, callbacks=train_callbacks,
-                                      validation_data=val_data)
+            history = self._model.fit(_prefetch_to_device(dataset, train_data), epochs=epochs, shuffle=shuffle_files,
+                                      callbacks=train_callbacks, validation_data=_prefetch_to_device(dataset, val_data))
             self._history = history.history
             return self._history
 
@@ -227,9 +228,9 @@ class TFHubImageClassificationModel(TFImageClassificationModel):
                 optimizer=self._optimizer_class(),
                 loss=self._loss,
                 metrics=['acc'])
-            return original_model.evaluate(eval_dataset, callbacks=callbacks)
+            return original_model.evaluate(_prefetch_to_device(dataset, eval_dataset), callbacks=callbacks)
         else:
-            return self._model.evaluate(eval_dataset, callbacks=callbacks)
+            return self._model.evaluate(_prefetch_to_device(dataset, eval_dataset), callbacks=callbacks)
 
     def predict(self, input_samples, return_type='class', callbacks=None):
         """
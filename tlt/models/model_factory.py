@@ -18,7 +18,9 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
+import copy
 import os
+from functools import lru_cache
 from pydoc import locate
 
 from tlt import TLT_BASE_DIR
@@ -205,33 +207,48 @@ def get_supported_models(framework: FrameworkType = None, use_case: UseCaseType
         NameError: if a model config file is found with an unknown or missing use case
 
     """
-    # Directory of json files for the supported models
-    config_directory = os.path.join(TLT_BASE_DIR, "models/configs")
-
-    # Models dictionary with keys for use case / model name / framework / model info
-    models = {}
-
     if framework is not None and not isinstance(framework, FrameworkType):
         framework = FrameworkType.from_str(framework)
 
     if use_case is not None and not isinstance(use_case, UseCaseType):
         use_case = UseCaseType.from_str(use_case)
 
-    # Initialize the models dictionary by use case
-    if use_case is None:
-        for uc in UseCaseType:
-            models[str(uc)] = {}
-    else:
-        models[str(use_case)] = {}
+    all_models = _all_supported_models()
+
+    # Models dictionary with keys for use case / model name / framework / model info
+    models = {}
+    for uc in [str(use_case)] if use_case is not None else [str(uc) for uc in UseCaseType]:
+        models[uc] = {}
+        for model_name, framework_dict in all_models[uc].items():
+            if framework is None:
+                models[uc][model_name] = framework_dict
+            elif str(framework) in framework_dict:
+                models[uc][model_name] = {str(framework): framework_dict[str(framework)]}
+
+    # Copy the result so that callers cannot modify the cached dictionary
+    return copy.deepcopy(models)
+
+
+@lru_cache(maxsize=1)
+def _all_supported_models():
+    """
+    Reads the model config files into a dictionary of all the supported models, organized by use case, model name, and
+    framework. The result is cached, since the config files do not change while the package is in use.
+
+    Raises:
+        NameError: if a model config file is found with an unknown or missing use case
+    """
+    # Directory of json files for the supported models
+    config_directory = os.path.join(TLT_BASE_DIR, "models/configs")
+
+    # Models dictionary with keys for use case / model name / framework / model info
+    models = {str(uc): {} for uc in UseCaseType}
 
     # Read configs into the models dictionary
     for config_file in [x for x in os.listdir(config_directory) if os.path.isfile(os.path.join(config_directory, x))]:
-        # Figure out which framework this config is, and filter it out, if necessary
+        # Figure out which framework this config is
         config_framework = FrameworkType.TENSORFLOW if 'tf' in config_file else FrameworkType.PYTORCH
 
-        if framework is not None and framework != config_framework:
-            continue
-
         # Figure out which use case this config file is for
         config_use_case = None
         for uc in UseCaseType:
@@ -243,18 +260,13 @@ def get_supported_models(framework: FrameworkType = None, use_case: UseCaseType
             raise NameError("The config file {} does not match any of the supported use case types".format(
                 config_file))
 
-        # Filter the config file out, by use case, if necessary
-        if use_case is not None and str(use_case) != config_use_case:
-            continue
-
-        # If it hasn't been filtered out, then read the config from the json file
         config_dict = read_json_file(os.path.join(config_directory, config_file))
 
         for model_name in config_dict.keys():
-            if model_name not in models[str(config_use_case)].keys():
-                models[str(config_use_case)][model_name] = {}
+            if model_name not in models[config_use_case].keys():
+                models[config_use_case][model_name] = {}
 
-            models[str(config_use_case)][model_name][str(config_framework)] = config_dict[model_name]
+            models[config_use_case][model_name][str(config_framework)] = config_dict[model_name]
 
     return models
 